@@ -5,68 +5,251 @@
 # 4. Set the environment variable ANTHROPIC_API_KEY="your_anthropic_api_key"
 # 5. Execute the script: python3 app.py
 
-from typing import List, Dict
-from litellm import completion
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterable, AsyncIterator, Deque, List, Dict, Optional
+from litellm import acompletion, token_counter
 from firewall_util import (
+	STRICT_MODE,
+	ScanResult,
 	initialize_firewall_client,
-	get_sanitized_prompt,
-	get_sanitized_response,
+	save_cache,
+	aget_sanitized_prompt,
+	aget_sanitized_response,
 )
 
+MODEL = "claude-sonnet-4-5-20250929"
+MAX_HISTORY_MESSAGES = 20  # user/assistant messages kept from earlier turns
+MAX_PROMPT_TOKENS = 8_000  # token budget for the system prompt plus history sent each turn
+SPECULATIVE_COMPLETION = False  # set True to start the LLM call while the prompt is scanned (sends unscanned prompts to the LLM; never used in STRICT_MODE)
+WARM_UP_LLM = True  # send a 1-token request at startup so the first turn reuses an open connection
+CACHE_SAVE_INTERVAL = 60  # seconds between background saves of the scan cache
+# Streamed response text is scanned and shown in segments of at least this many characters.
+# Smaller segments reach the screen sooner but cost more scans; a reply longer than one
+# segment also gets one full-response scan once the stream ends.
+STREAM_SCAN_MIN_CHARS = 200
+# Kept byte-identical across turns so the provider can reuse its cached prefix
+SYSTEM_PROMPT = "You have access to GitHub data through MCP tools. Use these tools to gather information about users and their contributions. Available tools include search_users, list_repositories, and other GitHub-related functions."
 
-def app(messages: List[Dict[str, str]]) -> str:
-	response = completion(
-		model="claude-sonnet-4-5-20250929",
+logger = logging.getLogger(__name__)
+
+
+class _TextStream:
+	# Text deltas of a streamed completion. aclose() releases the HTTP stream, which
+	# otherwise stays open while the provider keeps generating (and billing) tokens.
+	def __init__(self, response: Any) -> None:
+		self._response = response
+
+	async def __aiter__(self) -> AsyncIterator[str]:
+		async for chunk in self._response:
+			delta = chunk.choices[0].delta.content
+			if delta:
+				yield delta
+
+	async def aclose(self) -> None:
+		for stream in (self._response, getattr(self._response, "completion_stream", None)):
+			close = getattr(stream, "aclose", None)
+			if close is not None:
+				try:
+					await close()
+				except Exception as e:
+					logger.debug(f"Closing completion stream failed: {e}")
+
+
+async def app(messages: List[Dict[str, Any]]) -> _TextStream:
+	response = await acompletion(
+		model=MODEL,
 		messages=messages,
 		tools=["mcp_github"],  # Enable GitHub MCP tools
 		tool_choice="auto",  # Allow Claude to automatically choose when to use tools
-	)	
-	# print(f"""
-	# RESPONSE DETAILS (Model: {response.model}, ID: {response.id}, Created: {response.created})
-	# CONTENT ({response.choices[0].message.content})
-	# USAGE (Prompt tokens: {response.usage.prompt_tokens}, Completion tokens: {response.usage.completion_tokens}, Total tokens: {response.usage.total_tokens})
-	# METADATA (Finish reason: {response.choices[0].finish_reason}, Role: {response.choices[0].message.role})
-	# """)
-	return response.choices[0].message.content
+		stream=True,
+	)
+	return _TextStream(response)
 
 
-def secure_app(messages: List[Dict[str, str]]) -> str:
-	initialize_firewall_client("r@accuknox.com")
-	
-	prompt_scan_result = get_sanitized_prompt(messages[-1]["content"])
-	if prompt_scan_result.block: return prompt_scan_result.fallback_response
-	messages[-1]["content"] = prompt_scan_result.sanitized_content
+async def _segments(deltas: AsyncIterable[str]) -> AsyncIterator[str]:
+	# Regroup streamed text into segments ending at a sentence or line boundary
+	buffer = ""
+	async for delta in deltas:
+		buffer += delta
+		boundary = max(buffer.rfind(". "), buffer.rfind("\n")) + 1
+		if boundary >= STREAM_SCAN_MIN_CHARS:
+			yield buffer[:boundary]
+			buffer = buffer[boundary:]
+	if buffer:
+		yield buffer
+
+
+async def _tee(deltas: AsyncIterable[str], parts: List[str]) -> AsyncIterator[str]:
+	async for delta in deltas:
+		parts.append(delta)
+		yield delta
+
+
+async def _scan_stream(prompt: str, session_id: Optional[str], deltas: AsyncIterable[str]) -> AsyncIterator[ScanResult]:
+	# A producer keeps reading the LLM stream and starts a scan per segment;
+	# results are yielded in order, so scanning overlaps with generation.
+	scans: asyncio.Queue = asyncio.Queue()
+
+	async def produce() -> None:
+		try:
+			async for segment in _segments(deltas):
+				await scans.put(asyncio.create_task(aget_sanitized_response(prompt, segment, session_id=session_id)))
+		finally:
+			scans.put_nowait(None)
+
+	producer = asyncio.create_task(produce())
+	try:
+		while (scan := await scans.get()) is not None:
+			yield await scan
+		await producer  # re-raise errors from the LLM stream
+	finally:
+		producer.cancel()
+		while not scans.empty():
+			pending = scans.get_nowait()
+			if pending is not None:
+				pending.cancel()
+
+
+async def _discard_speculative_completion(task: asyncio.Task) -> None:
+	if not task.done():
+		task.cancel()
+	elif not task.cancelled() and task.exception() is None:
+		# The stream is already open, so cancelling the task alone would leave it generating
+		await task.result().aclose()
+	logger.info("Discarded speculative completion; tokens generated before it was stopped are still billed")
+
+
+async def secure_app(messages: List[Dict[str, Any]]) -> AsyncIterator[str]:
+	# Yields the sanitized reply as it streams, then appends the vetted assistant turn to `messages`
+	last_message = messages[-1]
+	prompt = last_message["content"]
+	# The LLM call dominates latency, so outside STRICT_MODE it starts on the raw prompt
+	# while the scan runs. Its result is only used if the scan passes the prompt unchanged.
+	speculative_task = None
+	if SPECULATIVE_COMPLETION and not STRICT_MODE:
+		speculative_task = asyncio.create_task(app([*messages[:-1], dict(last_message)]))
+
+	use_speculation = False
+	try:
+		prompt_scan_result = await aget_sanitized_prompt(prompt)
+		use_speculation = not prompt_scan_result.block and prompt_scan_result.sanitized_content == prompt
+	finally:
+		if speculative_task is not None and not use_speculation:
+			await _discard_speculative_completion(speculative_task)
+			speculative_task = None
+	if prompt_scan_result.block:
+		messages.append({"role": "assistant", "content": prompt_scan_result.fallback_response})
+		yield prompt_scan_result.fallback_response
+		return
+	last_message["content"] = prompt_scan_result.sanitized_content
 	
-	response = app(messages)  # your original logic
+	deltas = await (speculative_task or app(messages))  # your original logic
 	
-	response_scan_result = get_sanitized_response(response.choices[0].message.content)
-	if response_scan_result.block: return response_scan_result.fallback_response
-	return response_scan_result.sanitized_content
-
-
-def main() -> None:
-	messages: List[Dict[str, str]] = [
-		{
-			"role": "system",
-			"content": "You have access to GitHub data through MCP tools. Use these tools to gather information about users and their contributions. Available tools include search_users, list_repositories, and other GitHub-related functions."
-		}
-	]
+	response_parts: List[str] = []
+	segment_results: List[ScanResult] = []
+	try:
+		response_scan_results = _scan_stream(
+			last_message["content"], prompt_scan_result.session_id, _tee(deltas, response_parts)
+		)
+		async with aclosing(response_scan_results):
+			async for response_scan_result in response_scan_results:
+				if response_scan_result.block:
+					messages.append({"role": "assistant", "content": response_scan_result.fallback_response})
+					yield response_scan_result.fallback_response
+					return
+				segment_results.append(response_scan_result)
+				yield response_scan_result.sanitized_content
+	finally:
+		await deltas.aclose()
+
+	if len(segment_results) == 1:
+		# The only segment was the whole response, and it has been scanned already
+		messages.append({"role": "assistant", "content": segment_results[0].sanitized_content})
+		return
+	# Segments are scanned separately for display; the complete response is scanned once
+	# more, after the last segment is shown, so content spanning segments is checked as a
+	# whole before it enters the history. This extra scan is never a cache hit.
+	response_scan_result = await aget_sanitized_response(
+		last_message["content"],
+		"".join(response_parts),
+		session_id=prompt_scan_result.session_id,
+	)
+	if response_scan_result.block:
+		messages.append({"role": "assistant", "content": response_scan_result.fallback_response})
+		yield "\n" + response_scan_result.fallback_response
+		return
+	messages.append({"role": "assistant", "content": response_scan_result.sanitized_content})
+
+
+def trim_history(system_message: Dict[str, Any], history: Deque[Dict[str, Any]]) -> None:
+	# Drop the oldest messages until the conversation starts with a user turn and fits the token budget
+	while len(history) > 1 and (
+		history[0]["role"] != "user"
+		or token_counter(model=MODEL, messages=[system_message, *history]) > MAX_PROMPT_TOKENS
+	):
+		history.popleft()
+
+
+async def _warm_up_llm() -> None:
+	try:
+		await acompletion(model=MODEL, messages=[{"role": "user", "content": "ping"}], max_tokens=1)
+	except Exception as e:
+		logger.debug(f"LLM connection warm-up failed: {e}")
+
+
+async def _persist_cache_periodically() -> None:
 	while True:
-		prompt: str = input("Prompt: ")
-		messages.append({
+		await asyncio.sleep(CACHE_SAVE_INTERVAL)
+		await asyncio.to_thread(save_cache)
+
+
+async def main() -> None:
+	initialize_firewall_client("r@accuknox.com")
+	# Background work keeps running while waiting for input, since input() runs in a worker thread;
+	# the set holds references so the tasks are not garbage collected
+	background_tasks = {asyncio.create_task(_persist_cache_periodically())}
+	if WARM_UP_LLM:
+		background_tasks.add(asyncio.create_task(_warm_up_llm()))
+	system_message: Dict[str, Any] = {
+		"role": "system",
+		"content": [
+			{
+				"type": "text",
+				"text": SYSTEM_PROMPT,
+				"cache_control": {"type": "ephemeral"},  # mark the prefix for Anthropic prompt caching
+			}
+		],
+	}
+	history: Deque[Dict[str, Any]] = deque(maxlen=MAX_HISTORY_MESSAGES)
+	while True:
+		prompt: str = await asyncio.to_thread(input, "Prompt: ")
+		history.append({
 			"role": "user",
 			"content": prompt,
 		})
-		# response = app(messages)
-		response = secure_app(messages)
-		print(f"Response: {response}")
-		messages.append({
-			"role": "assistant",
-			"content": response,
-		})
+		trim_history(system_message, history)
+		messages = [system_message, *history]
+		# pieces = await app(messages)
+		pieces = secure_app(messages)
+		print("Response: ", end="", flush=True)
+		response_parts: List[str] = []
+		async for piece in pieces:
+			print(piece, end="", flush=True)
+			response_parts.append(piece)
+		print()
+		if messages[-1]["role"] == "assistant":
+			history.append(messages[-1])  # the reply as vetted by secure_app
+		else:
+			history.append({
+				"role": "assistant",
+				"content": "".join(response_parts),
+			})
 
 if __name__ == "__main__":
-	main()
+	asyncio.run(main())
 
 
 # prompt
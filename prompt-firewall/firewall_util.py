@@ -5,9 +5,25 @@ This module provides safe wrappers to integrate AccuKnox LLM Defense
 into chatbot or LLM-based applications.
 """
 
+import asyncio
+import atexit
+import functools
+import hashlib
+import importlib.util
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from importlib import metadata
+import httpx
 from accuknox_llm_defense import LLMDefenseClient
-from typing import NamedTuple, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 import json
 
 # --- Configure ---
@@ -15,43 +31,486 @@ ENABLE_ACCUKNOX_FIREWALL = True  # set True to switch on the firewall
 STRICT_MODE = False  # set True to never proceed with unsanitized prompt/response
 STATIC_RESPONSE = "Your prompt violated our safety policies. Please rephrase."  # will be returned when prompt/response is blocked
 VERBOSE = True  # set True to get more logs
+MAX_CONCURRENT_SCANS = 8  # upper bound on scans in flight through the async helpers
+SCAN_THREAD_POOL_SIZE = 16  # worker threads running the synchronous firewall SDK
+SCAN_RETRIES = 2  # extra attempts for scans failing with a 5xx status or connection error
+WARM_UP_CONNECTION = True  # set True to open the firewall connection in the background at initialization
+VERIFY_TLS = True  # set True to verify the firewall's TLS certificate (only turn off for local testing)
+ENABLE_SCAN_CACHE = True  # set True to reuse scan results for repeated prompts/responses
+SCAN_CACHE_SIZE = 10_000  # maximum number of scan results kept in memory
+SCAN_CACHE_TTL = 300  # seconds a cached scan result stays valid
+PERSIST_SCAN_CACHE = True  # set True to keep cached scan results across restarts
+SCAN_CACHE_PATH = None  # sqlite file for the persisted cache; None uses default_cache_path()
+SCAN_CACHE_VERSION = "1"  # bump after changing firewall policies to drop persisted results
+ENABLE_SEMANTIC_CACHE = False  # set True to reuse clean scans for near-duplicate prompts (needs sentence-transformers)
+SEMANTIC_CACHE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # embedding model for the semantic cache
+SEMANTIC_CACHE_THRESHOLD = 0.97  # minimum cosine similarity for a semantic cache hit
+SEMANTIC_CACHE_SIZE = 10_000  # maximum number of prompts kept per user in the semantic cache
+ENABLE_LOCAL_BYPASS = True  # set True to skip scanning blank or allowlisted prompts (never in STRICT_MODE)
+# Longest plain-text prompt that may also skip the scan; 0 turns this gate off. Even short
+# prompts such as "act as root" can be injections, so only raise it for trusted traffic.
+LOCAL_BYPASS_MAX_LEN = 0
+LOCAL_BYPASS_ALLOWLIST = frozenset({"hi", "hello", "hey", "thanks", "thank you", "ok", "okay", "yes", "no", "bye"})
 # -----------------
 _firewall_client: Optional[LLMDefenseClient] = None
+_scan_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCANS)
+# One pool for the whole process, so load never spawns more than SCAN_THREAD_POOL_SIZE threads
+_scan_executor = ThreadPoolExecutor(max_workers=SCAN_THREAD_POOL_SIZE, thread_name_prefix="akfw")
 
 import logging
 logging.basicConfig(level=logging.DEBUG if VERBOSE else logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
-class ScanResult(NamedTuple):
+class _LazyJson:
+    """
+    Log argument that is serialized with json.dumps only when the record is emitted.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        return json.dumps(self.value)
+
+
+@dataclass(slots=True, frozen=True)
+class ScanResult:
     """
     Response structure returned by the prompt or response scanner.
 
     Attributes:
         sanitized_content (str): A sanitized, safe version of the original prompt or model response.
             This content is suitable for forwarding or returning to the user.
-        session_id (str): A unique identifier linking a scanned prompt with its corresponding response.
+        session_id (Optional[str]): A unique identifier linking a scanned prompt with its corresponding response.
         block (bool): A flag indicating whether the original content should be blocked.
             If True, the application should prevent forwarding and instead use the fallback_response.
         fallback_response (str): A safe, preconstructed response to return to the user when
             block is True. This may be an explanatory message or an empty string if not applicable.
 
     Notes:
-        - ScanResult is immutable (as a NamedTuple); it should be treated as read-only.
+        - ScanResult is immutable (a frozen, slotted dataclass); it should be treated as read-only.
         - Always check the `block` flag before using `sanitized_content` in downstream processing 
           to ensure compliance with content policies.
     """
     sanitized_content: str
-    session_id: str
+    session_id: Optional[str]
     block: bool
     fallback_response: str
 
 
+# Shared result for prompts blocked without a scan (STRICT_MODE with no client or a scan
+# error); ScanResult is immutable, so one instance serves every such call.
+_UNSCANNED_BLOCK = ScanResult("", None, True, "")
+
+
+class _CachedScan(NamedTuple):
+    """
+    Scan decision kept by the scan cache.
+
+    Only the decision is stored, never the raw content: `sanitized_content` is None
+    when the firewall returned the content unchanged or blocked it, and the caller's
+    own content is used in its place on a hit. Session ids are not stored either, since
+    they link one prompt scan to its own response and must not leak into another turn.
+    """
+    sanitized_content: Optional[str]
+    block: bool
+    expires_at: float
+
+
+class _ScanCache:
+    """
+    Thread-safe LRU cache of scan decisions with a per-entry expiry time.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, _CachedScan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[_CachedScan]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: bytes, sanitized_content: Optional[str], block: bool) -> None:
+        entry = _CachedScan(sanitized_content, block, time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def items(self) -> List[Tuple[bytes, _CachedScan]]:
+        with self._lock:
+            return list(self._entries.items())
+
+    def update(self, entries: Iterable[Tuple[bytes, _CachedScan]]) -> None:
+        with self._lock:
+            for key, entry in entries:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_scan_cache = _ScanCache(SCAN_CACHE_SIZE, SCAN_CACHE_TTL)
+
+
+def _scan_cache_key(kind: str, *contents: str) -> Optional[bytes]:
+    """
+    Build the cache key for a scan, or None when caching is disabled.
+
+    The key is the SHA-256 of the scan kind, the firewall user and the contents,
+    with whitespace runs collapsed so trivially different inputs share an entry.
+    """
+    if not ENABLE_SCAN_CACHE:
+        return None
+    user = _firewall_client.user_info if _firewall_client else ""
+    normalized = (" ".join(content.split()) for content in contents)
+    return hashlib.sha256("\0".join((kind, user, *normalized)).encode()).digest()
+
+
+def _cached_scan_result(key: Optional[bytes], content: str, session_id: Optional[str] = None) -> Optional[ScanResult]:
+    """
+    Rebuild a ScanResult for `content` from the scan cache, or None on a miss.
+
+    The result carries the caller's `session_id` (None for prompts), never the
+    session of the scan that populated the entry.
+    """
+    if key is None:
+        return None
+    entry = _scan_cache.get(key)
+    if entry is None:
+        return None
+    if entry.block:
+        return ScanResult("", session_id, True, STATIC_RESPONSE)
+    sanitized_content = content if entry.sanitized_content is None else entry.sanitized_content
+    return ScanResult(sanitized_content, session_id, False, "")
+
+
+def _remember_scan_result(key: Optional[bytes], content: str, result: ScanResult) -> None:
+    """
+    Store the decision carried by `result` in the scan cache.
+    """
+    if key is None:
+        return
+    sanitized_content = None if result.block or result.sanitized_content == content else result.sanitized_content
+    _scan_cache.put(key, sanitized_content, result.block)
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache of clean prompt scans, partitioned by firewall user.
+
+    Prompts are embedded with a sentence-transformers model and compared by cosine
+    similarity against the cached prompts of the same user. Only prompts the firewall
+    passed unchanged are stored, so a hit lets the new prompt through as-is and never
+    substitutes another prompt's text. Embeddings are kept as float16 to halve memory.
+
+    Args:
+        model_name (str): sentence-transformers model used to embed prompts.
+        threshold (float): Minimum cosine similarity for a hit.
+        maxsize (int): Maximum number of prompts kept per user; the oldest are evicted first.
+        ttl (float): Seconds an entry stays valid.
+
+    Raises:
+        ImportError: If sentence-transformers or numpy is not installed.
+    """
+
+    def __init__(self, model_name: str, threshold: float, maxsize: int, ttl: float) -> None:
+        import numpy
+        from sentence_transformers import SentenceTransformer
+
+        self._np = numpy
+        self._model = SentenceTransformer(model_name)
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # user -> (float16 embeddings, expiry times), oldest first
+        self._partitions: Dict[str, Tuple[Any, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, prompt: str) -> Any:
+        return self._model.encode(prompt, normalize_embeddings=True).astype(self._np.float16)
+
+    def lookup(self, user: str, embedding: Any) -> Optional[_CachedScan]:
+        """
+        Return the decision cached for the closest prompt of `user`, or None when no
+        unexpired prompt reaches the similarity threshold.
+        """
+        with self._lock:
+            vectors, expiries = self._live_partition(user)
+            if vectors is None:
+                return None
+            similarities = vectors @ embedding
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                return None
+            return _CachedScan(None, False, expiries[best])
+
+    def add(self, user: str, embedding: Any) -> None:
+        with self._lock:
+            vectors, expiries = self._live_partition(user)
+            row = embedding.reshape(1, -1)
+            vectors = row if vectors is None else self._np.vstack((vectors, row))[-self.maxsize:]
+            expiries = (expiries + [time.time() + self.ttl])[-self.maxsize:]
+            self._partitions[user] = (vectors, expiries)
+
+    def _live_partition(self, user: str) -> Tuple[Any, List[float]]:
+        # Drops expired rows so they can never shadow a fresh entry for the same
+        # prompt; the caller holds the lock
+        vectors, expiries = self._partitions.get(user, (None, []))
+        now = time.time()
+        live = [i for i, expires_at in enumerate(expiries) if expires_at > now]
+        if len(live) == len(expiries):
+            return vectors, expiries
+        if not live:
+            self._partitions.pop(user, None)
+            return None, []
+        vectors, expiries = vectors[live], [expiries[i] for i in live]
+        self._partitions[user] = (vectors, expiries)
+        return vectors, expiries
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_scan_cache_path: Optional[str] = None
+
+
+def _client_version() -> str:
+    try:
+        return metadata.version("accuknox-llm-defense")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def default_cache_path() -> str:
+    """
+    Return the default location of the persisted scan cache, under
+    $XDG_CACHE_HOME (or ~/.cache) in an `accuknox` directory.
+    """
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "accuknox", "scan_cache.sqlite3")
+
+
+def _open_cache_db(path: str) -> sqlite3.Connection:
+    # Private to the current user: 0700 directory, 0600 database (sqlite gives the
+    # -wal/-shm files the same mode as the database)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    os.chmod(path, 0o600)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS scan_decisions ("
+        " key BLOB PRIMARY KEY,"
+        " ruleset_version TEXT NOT NULL,"
+        " client_version TEXT NOT NULL,"
+        " block INTEGER NOT NULL,"
+        " expires_at REAL NOT NULL)"
+    )
+    return connection
+
+
+def load_cache(path: str) -> None:
+    """
+    Load persisted scan results from `path` into the in-memory scan cache.
+
+    Args:
+        path (str): Location of the sqlite cache file; created if missing.
+
+    Behavior:
+        - Only entries written with the current SCAN_CACHE_VERSION and
+          accuknox-llm-defense version that have not expired are loaded.
+        - The file holds only key hashes and decisions, never prompt or response text.
+        - Registers `save_cache` to run at interpreter exit the first time it is called.
+        - Failures to read the file are logged and otherwise ignored.
+    """
+    global _scan_cache_path
+    if _scan_cache_path is None:
+        atexit.register(save_cache)
+    _scan_cache_path = path
+    try:
+        with closing(_open_cache_db(path)) as connection, connection:
+            rows = connection.execute(
+                "SELECT key, block, expires_at FROM scan_decisions"
+                " WHERE ruleset_version = ? AND client_version = ? AND expires_at > ?"
+                " ORDER BY expires_at",
+                (SCAN_CACHE_VERSION, _client_version(), time.time()),
+            ).fetchall()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not load scan cache from '{path}': {e}")
+        return
+    _scan_cache.update(
+        (key, _CachedScan(None, bool(block), expires_at))
+        for key, block, expires_at in rows
+    )
+    logger.debug(f"Loaded {len(rows)} cached scan results from '{path}'")
+
+
+def save_cache(path: Optional[str] = None) -> None:
+    """
+    Write the in-memory scan cache to disk in a single transaction.
+
+    Args:
+        path (Optional[str]): Location of the sqlite cache file. Defaults to the
+            path last passed to `load_cache`; nothing is written if there is none.
+
+    Behavior:
+        - Expired rows are removed and the current entries are upserted in bulk,
+          so scans never wait on a per-entry disk write.
+        - Entries whose content the firewall rewrote stay in memory only, so no
+          sanitized text or session id reaches the disk.
+        - Failures to write the file are logged and otherwise ignored.
+    """
+    path = path or _scan_cache_path
+    if not path:
+        return
+    now = time.time()
+    rows = [
+        (key, SCAN_CACHE_VERSION, _client_version(), int(entry.block), entry.expires_at)
+        for key, entry in _scan_cache.items()
+        if entry.expires_at > now and entry.sanitized_content is None
+    ]
+    try:
+        with closing(_open_cache_db(path)) as connection, connection:
+            connection.execute("DELETE FROM scan_decisions WHERE expires_at <= ?", (now,))
+            connection.executemany("INSERT OR REPLACE INTO scan_decisions VALUES (?, ?, ?, ?, ?)", rows)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not save scan cache to '{path}': {e}")
+
+
+
+_RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+def _build_http_client() -> httpx.Client:
+    """
+    Build the keep-alive HTTP client shared by every firewall scan in the process.
+
+    HTTP/2 is used when the optional `h2` package is installed, so concurrent scans
+    are multiplexed over a single connection instead of one connection each.
+    """
+    return httpx.Client(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=httpx.Timeout(10.0, connect=2.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        verify=VERIFY_TLS,
+    )
+
+
+_http_client = _build_http_client()
+atexit.register(_http_client.close)
+
+
+class _PooledLLMDefenseClient(LLMDefenseClient):
+    """
+    LLMDefenseClient that sends scans over the shared `_http_client`.
+
+    The SDK posts every scan with a bare `requests.post`, which opens a new
+    TCP connection and TLS handshake each time. This subclass keeps the SDK's
+    request format and error contract but reuses pooled (HTTP/2 when available)
+    connections. Error dicts for 5xx responses and connection failures are
+    marked `retryable` so `_retry` can try the scan again; read timeouts are
+    not, as the scan may still be running server-side.
+    """
+
+    def _post_request(self, payload, file=None, conversation_id=None):
+        params = {
+            "Client-Info": self.client_info,
+            "User": self.user_info,
+            "Conversation-Id": conversation_id if conversation_id is not None else self.conversation_id
+        }
+        # (None, value) tuples force multipart encoding even when no file is attached
+        form = {key: (None, str(value)) for key, value in payload.items() if value is not None}
+
+        try:
+            # Files are read up front so a retried request can send them again
+            if file is not None:
+                if isinstance(file, (str, os.PathLike)):
+                    with open(file, "rb") as opened_file:
+                        form["file"] = (os.path.basename(file), opened_file.read())
+                else:
+                    form["file"] = (os.path.basename(getattr(file, "name", "file")), file.read())
+
+            response = _http_client.post(self.base_url, params=params, files=form, headers=self.headers)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            return {"error": str(e), "status": status, "retryable": status in _RETRY_STATUSES}
+        except (httpx.ConnectTimeout, httpx.ConnectError) as e:
+            return {"error": str(e), "retryable": True}
+        except (httpx.HTTPError, ValueError, OSError) as e:
+            return {"error": str(e)}
+
+    def warm_up(self) -> None:
+        """
+        Resolve the firewall host and open a pooled TCP/TLS connection to it, so the
+        first scan does not pay for the handshake. Failures are logged and ignored.
+        """
+        try:
+            _http_client.head(self.base_url, timeout=5)
+        except httpx.HTTPError as e:
+            logger.debug(f"Firewall connection warm-up failed: {e}")
+
+
+def _retry(call: Callable[[], dict], retries: Optional[int] = None, base: float = 0.05, cap: float = 0.5) -> dict:
+    """
+    Invoke a scan call, repeating it while it returns a `retryable` error.
+
+    Args:
+        call (Callable[[], dict]): The scan call; returns the firewall response dict.
+        retries (Optional[int]): Number of extra attempts after the first; None uses SCAN_RETRIES.
+        base (float): Backoff in seconds before the first retry, doubled afterwards.
+        cap (float): Upper bound on any single backoff in seconds.
+
+    Returns:
+        dict: The first non-retryable response, or the last error once retries are exhausted.
+
+    Behavior:
+        - Waits a random time up to min(cap, base * 2 ** attempt) between attempts
+          (full jitter), so concurrent callers do not retry in lockstep.
+        - Only connection failures and 5xx responses are retried. Each attempt that
+          fails to connect is bounded by the 2s connect timeout, so with the default
+          SCAN_RETRIES a scan holds its `_scan_semaphore` slot for about 3 x 2s plus
+          backoff at worst. A 10s read timeout is returned without a retry.
+        - STRICT_MODE handling of a final error is left to the caller.
+    """
+    if retries is None:
+        retries = SCAN_RETRIES
+    result = call()
+    for attempt in range(retries):
+        if not (result.get("error") is not None and result.get("retryable")):
+            break
+        delay = random.uniform(0, min(cap, base * 2 ** attempt))
+        logger.debug("Firewall scan failed with '%s', retrying in %.3fs", result["error"], delay)
+        time.sleep(delay)
+        result = call()
+    return result
+
 
 def initialize_firewall_client(user: Optional[str] = "") -> None:
     """
     Initialize or re-initialize the global firewall client.
 
+    Calling it again for the user the current client was built for is a no-op,
+    so the client and its pooled connections are shared across calls.
+
     Args:
         user (Optional[str]): Optional user identifier passed as `user_info` 
             when constructing the LLMDefenseClient. Defaults to an empty string.
@@ -66,23 +525,41 @@ def initialize_firewall_client(user: Optional[str] = "") -> None:
         - If ENABLE_ACCUKNOX_FIREWALL is falsy, sets `_firewall_client` to None.
         - If ENABLE_ACCUKNOX_FIREWALL is truthy:
             - Reads ACCUKNOX_API_KEY from the environment.
-            - If a key is found, constructs an LLMDefenseClient.
+            - Keeps the existing client if it was built for the same `user`.
+            - If a key is found, constructs an LLMDefenseClient and, if WARM_UP_CONNECTION
+              is on, opens its connection on the scan thread pool.
             - If missing, logs an error, resets `_firewall_client`, and possibly raises an error.
 
+        - If ENABLE_SCAN_CACHE and PERSIST_SCAN_CACHE are on, loads the persisted
+          scan cache from SCAN_CACHE_PATH once per process.
+        - If ENABLE_SEMANTIC_CACHE is on, loads the embedding model once per process;
+          if its dependencies are missing, logs an error and continues without it.
+
     Side Effects:
         Modifies the module-level `_firewall_client`, reads environment variables,
         and logs errors if configuration is invalid.
     """
-    global _firewall_client
+    global _firewall_client, _semantic_cache
+    if ENABLE_SCAN_CACHE and PERSIST_SCAN_CACHE and _scan_cache_path is None:
+        load_cache(SCAN_CACHE_PATH or default_cache_path())
+    if ENABLE_SEMANTIC_CACHE and _semantic_cache is None:
+        try:
+            _semantic_cache = SemanticCache(SEMANTIC_CACHE_MODEL, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SCAN_CACHE_TTL)
+        except ImportError as e:
+            logger.error(f"Semantic cache disabled, missing dependency: {e}")
     if not ENABLE_ACCUKNOX_FIREWALL:
         _firewall_client = None
+    elif _firewall_client is not None and _firewall_client.user_info == user:
+        return
     else:
         accuknox_api_key = os.getenv("ACCUKNOX_API_KEY")
         if accuknox_api_key:
-            _firewall_client = LLMDefenseClient(
+            _firewall_client = _PooledLLMDefenseClient(
                 llm_defense_api_key = accuknox_api_key,
                 user_info = user
             )
+            if WARM_UP_CONNECTION:
+                _scan_executor.submit(_firewall_client.warm_up)
         else:
             logger.error("Missing required environment variable: ACCUKNOX_API_KEY")
             _firewall_client = None
@@ -90,6 +567,25 @@ def initialize_firewall_client(user: Optional[str] = "") -> None:
                 raise RuntimeError("Missing required environment variable: ACCUKNOX_API_KEY")
 
 
+@functools.lru_cache(maxsize=4)
+def _safe_prompt_re(max_len: int) -> "re.Pattern[str]":
+    # Anchored (via fullmatch) and length-bounded so matching stays linear on any input
+    return re.compile(rf"[\w\s.,?!'-]{{1,{max_len}}}")
+
+
+def _is_trivially_safe(prompt: str) -> bool:
+    """
+    Return True for prompts that are blank, allowlisted, or (when LOCAL_BYPASS_MAX_LEN
+    is set) short plain text.
+    """
+    stripped = prompt.strip()
+    return (
+        not stripped
+        or stripped.lower() in LOCAL_BYPASS_ALLOWLIST
+        or (LOCAL_BYPASS_MAX_LEN > 0 and _safe_prompt_re(LOCAL_BYPASS_MAX_LEN).fullmatch(stripped) is not None)
+    )
+
+
 def get_sanitized_prompt(prompt: str) -> ScanResult:
     """
     Scan and sanitize a prompt using the configured Prompt Firewall.
@@ -102,10 +598,19 @@ def get_sanitized_prompt(prompt: str) -> ScanResult:
         a block flag, and a fallback response string.
 
     Behavior:
+        - If ENABLE_LOCAL_BYPASS is on and STRICT_MODE is off, blank prompts, prompts in
+          LOCAL_BYPASS_ALLOWLIST and, if LOCAL_BYPASS_MAX_LEN is non-zero, plain-text prompts
+          up to that length are returned unchanged without a scan (with no session ID).
+        - If _firewall_client is set and ENABLE_SCAN_CACHE is on, a cached decision for
+          the same prompt and user (younger than SCAN_CACHE_TTL) is returned without a scan.
+        - Otherwise, if the semantic cache is enabled and a near-duplicate prompt of the
+          same user was passed unchanged, returns a non-blocking result for `prompt`.
         - If _firewall_client is set, runs scan_prompt(content=prompt).
             - On scan error:
                 - If STRICT_MODE is True, returns a blocking ScanResult.
                 - Otherwise, logs a warning and returns a non-blocking result.
+            - Retries up to SCAN_RETRIES times with jittered backoff on 5xx statuses
+              and connection errors; read timeouts are not retried.
             - If query_status is "BLOCK", logs the event and returns a blocking ScanResult 
               with STATIC_RESPONSE.
             - For other statuses ("PASS", "MONITOR", etc.), returns a non-blocking result.
@@ -113,39 +618,66 @@ def get_sanitized_prompt(prompt: str) -> ScanResult:
             - If STRICT_MODE is True, returns a blocking ScanResult.
             - Otherwise, logs a debug message and returns a non-blocking result.
     """
+    if ENABLE_LOCAL_BYPASS and not STRICT_MODE and _is_trivially_safe(prompt):
+        return ScanResult(prompt, None, False, "")
     if _firewall_client:
-        sanitized_prompt_dict: dict = _firewall_client.scan_prompt(content=prompt)
-        if "error" in sanitized_prompt_dict:
+        cache_key = _scan_cache_key("prompt", prompt)
+        cached_result = _cached_scan_result(cache_key, prompt)
+        if cached_result is not None:
+            return cached_result
+        embedding = _semantic_cache.embed(prompt) if _semantic_cache else None
+        if embedding is not None:
+            entry = _semantic_cache.lookup(_firewall_client.user_info, embedding)
+            if entry is not None:
+                return ScanResult(prompt, None, False, "")
+        sanitized_prompt_dict: dict = _retry(lambda: _firewall_client.scan_prompt(content=prompt))
+        if sanitized_prompt_dict.get("error") is not None:
             if STRICT_MODE:
-                return ScanResult(prompt, None, True, "")
+                return _UNSCANNED_BLOCK
             else:
                 logger.warning("Prompt Firewall scanning got error, returning unsanitized prompt")
                 return ScanResult(prompt, None, False, "")
-        logger.info(f"The prompt was analyzed against following policies: \n{json.dumps(sanitized_prompt_dict.get('risk_score', {}))}")
+        logger.info("The prompt was analyzed against following policies: \n%s", _LazyJson(sanitized_prompt_dict.get("risk_score", {})))
         prompt_sanitization_action = sanitized_prompt_dict.get("query_status")
+        sanitized_content = sanitized_prompt_dict.get("sanitized_content")
+        scan_session_id = sanitized_prompt_dict.get("session_id")
         if prompt_sanitization_action == "BLOCK":
-            logger.info(f"Prompt '{prompt}' triggered BLOCK action")
-            return ScanResult(
-                sanitized_prompt_dict.get("sanitized_content"),
-                sanitized_prompt_dict.get("session_id"),
-                True,
-                STATIC_RESPONSE,
-            )
+            logger.info("Prompt '%s' triggered BLOCK action", prompt)
+            result = ScanResult(sanitized_content, scan_session_id, True, STATIC_RESPONSE)
         else:  # prompt_sanitization_action in ("UNCHECKED", "PASS", "MONITOR")
-            return ScanResult(
-                sanitized_prompt_dict.get("sanitized_content"),
-                sanitized_prompt_dict.get("session_id"),
-                False,
-                "",
-            )
+            result = ScanResult(sanitized_content, scan_session_id, False, "")
+        _remember_scan_result(cache_key, prompt, result)
+        if embedding is not None and not result.block and result.sanitized_content == prompt:
+            _semantic_cache.add(_firewall_client.user_info, embedding)
+        return result
     else:
         if STRICT_MODE:
-            return ScanResult(prompt, None, True, "")
+            return _UNSCANNED_BLOCK
         else:
             logger.debug("Firewall client not initialized, returning unsanitized prompt")
             return ScanResult(prompt, None, False, "")
 
 
+def get_sanitized_prompts(prompts: List[str]) -> List[ScanResult]:
+    """
+    Scan and sanitize several prompts at once.
+
+    Args:
+        prompts (List[str]): The raw user prompts to be scanned or sanitized.
+
+    Returns:
+        List[ScanResult]: One result per prompt, in the same order as `prompts`.
+
+    Behavior:
+        - The firewall API has no batch endpoint, so each prompt is scanned with
+          `get_sanitized_prompt`; the scans run in parallel on the shared scan thread
+          pool so the total latency approaches that of the slowest scan instead of the sum.
+    """
+    if len(prompts) <= 1:
+        return [get_sanitized_prompt(prompt) for prompt in prompts]
+    return list(_scan_executor.map(get_sanitized_prompt, prompts))
+
+
 def get_sanitized_response(prompt: str, response: str, session_id: Optional[str] = None) -> ScanResult:
     """
     Scan and sanitize a application's response using the configured firewall client.
@@ -161,7 +693,11 @@ def get_sanitized_response(prompt: str, response: str, session_id: Optional[str]
 
     Behavior:
         - If _firewall_client is set:
-            - Calls scan_response(prompt, content, session_id).
+            - Returns a cached decision for the same prompt/response pair when
+              ENABLE_SCAN_CACHE is on and the entry is younger than SCAN_CACHE_TTL.
+            - Calls scan_response(prompt, content, session_id), retrying up to SCAN_RETRIES
+              times with jittered backoff on 5xx statuses and connection errors (read
+              timeouts are not retried).
             - On error:
                 - If STRICT_MODE is True, returns a blocking ScanResult.
                 - Otherwise, logs a warning and returns the unsanitized response.
@@ -173,34 +709,31 @@ def get_sanitized_response(prompt: str, response: str, session_id: Optional[str]
             - Otherwise, logs a debug message and returns a non-blocking result.
     """
     if _firewall_client:
-        sanitized_response_dict: dict = _firewall_client.scan_response(
+        cache_key = _scan_cache_key("response", prompt, response)
+        cached_result = _cached_scan_result(cache_key, response, session_id)
+        if cached_result is not None:
+            return cached_result
+        sanitized_response_dict: dict = _retry(lambda: _firewall_client.scan_response(
             content=response,
             prompt=prompt,
             session_id=session_id
-        )
-        if "error" in sanitized_response_dict:
+        ))
+        if sanitized_response_dict.get("error") is not None:
             if STRICT_MODE:
                 return ScanResult(response, session_id, True, "")
             else:
                 logger.warning("Response Firewall scanning got error, returning unsanitized response")
                 return ScanResult(response, session_id, False, "")
-        logger.info(f"The response was analyzed against following policies: \n{json.dumps(sanitized_response_dict.get('risk_score', {}))}")
+        logger.info("The response was analyzed against following policies: \n%s", _LazyJson(sanitized_response_dict.get("risk_score", {})))
         response_sanitization_action = sanitized_response_dict.get("query_status")
+        sanitized_content = sanitized_response_dict.get("sanitized_content")
         if response_sanitization_action == "BLOCK":
-            logger.info(f"Response '{response}' triggered BLOCK action")
-            return ScanResult(
-                sanitized_response_dict.get("sanitized_content"),
-                session_id,
-                True,
-                STATIC_RESPONSE,
-            )
+            logger.info("Response '%s' triggered BLOCK action", response)
+            result = ScanResult(sanitized_content, session_id, True, STATIC_RESPONSE)
         else:  # response_sanitization_action in ("UNCHECKED", "PASS", "MONITOR")
-            return ScanResult(
-                sanitized_response_dict.get("sanitized_content"),
-                session_id,
-                False,
-                "",
-            )
+            result = ScanResult(sanitized_content, session_id, False, "")
+        _remember_scan_result(cache_key, response, result)
+        return result
     else:
         if STRICT_MODE:
             return ScanResult(response, session_id, True, "")
@@ -208,3 +741,76 @@ def get_sanitized_response(prompt: str, response: str, session_id: Optional[str]
             logger.debug("Firewall client initialization failed, returning unsanitized response")
             return ScanResult(response, session_id, False, "")
 
+
+
+_inflight_scans: Dict[bytes, "asyncio.Future[ScanResult]"] = {}
+
+
+async def _single_flight(key: bytes, scan: Callable[[], Awaitable[ScanResult]]) -> ScanResult:
+    """
+    Await `scan()`, or join a scan with the same key that is already in flight.
+
+    Concurrent callers share one firewall call; the scan cache only helps once a
+    result has landed, so this covers the gap while the first scan is running.
+    Only the caller that started the scan gets its session_id; like a cache hit,
+    callers that joined it get None, so their response scans are not linked to
+    another caller's firewall session.
+    """
+    task = _inflight_scans.get(key)
+    if task is None:
+        task = asyncio.ensure_future(scan())
+        _inflight_scans[key] = task
+        task.add_done_callback(functools.partial(_forget_inflight_scan, key))
+        # Shielded so cancelling any caller, this one included, leaves the shared scan running
+        return await asyncio.shield(task)
+    result = await asyncio.shield(task)
+    return replace(result, session_id=None) if result.session_id is not None else result
+
+
+def _forget_inflight_scan(key: bytes, task: "asyncio.Future[ScanResult]") -> None:
+    if _inflight_scans.get(key) is task:
+        del _inflight_scans[key]
+    if not task.cancelled():
+        task.exception()  # mark as retrieved when every caller has gone away
+
+
+async def _scan_prompt_in_executor(prompt: str) -> ScanResult:
+    async with _scan_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(_scan_executor, get_sanitized_prompt, prompt)
+
+
+async def aget_sanitized_prompt(prompt: str) -> ScanResult:
+    """
+    Async counterpart of `get_sanitized_prompt`.
+
+    LLMDefenseClient is synchronous, so the scan runs on the shared scan thread pool
+    and the event loop stays free for other work. At most MAX_CONCURRENT_SCANS scans are
+    in flight at any time, and concurrent calls for the same prompt and user share a
+    single scan.
+    """
+    user = _firewall_client.user_info if _firewall_client else ""
+    key = hashlib.sha256(f"{user}\0{prompt}".encode()).digest()
+    return await _single_flight(key, lambda: _scan_prompt_in_executor(prompt))
+
+
+async def aget_sanitized_prompts(prompts: List[str]) -> List[ScanResult]:
+    """
+    Async counterpart of `get_sanitized_prompts`.
+
+    All prompts are submitted together and share the MAX_CONCURRENT_SCANS limit
+    with any other scans in flight. Results keep the order of `prompts`.
+    """
+    return list(await asyncio.gather(*(aget_sanitized_prompt(prompt) for prompt in prompts)))
+
+
+async def aget_sanitized_response(prompt: str, response: str, session_id: Optional[str] = None) -> ScanResult:
+    """
+    Async counterpart of `get_sanitized_response`.
+
+    Runs the scan on the shared scan thread pool, bounded by MAX_CONCURRENT_SCANS like
+    `aget_sanitized_prompt`.
+    """
+    async with _scan_semaphore:
+        return await asyncio.get_running_loop().run_in_executor(
+            _scan_executor, get_sanitized_response, prompt, response, session_id
+        )
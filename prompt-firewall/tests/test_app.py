@@ -0,0 +1,86 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+pytest.importorskip("litellm")
+
+import app
+import firewall_util
+
+REPLY = "".join(f"Sentence number {i} is here. " for i in range(20)) + "\nbad content\n" + "More text follows. " * 20
+
+
+class _FakeStream:
+    """Streamed completion that records whether it was closed."""
+
+    def __init__(self, text):
+        self.text = text
+        self.chunks_sent = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for i in range(0, len(self.text), 8):
+            await asyncio.sleep(0)
+            self.chunks_sent += 1
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=self.text[i:i + 8]))])
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _FakeFirewall:
+    """Blocks prompts containing 'block' and responses containing 'bad'."""
+
+    user_info = "user@example.com"
+
+    def scan_prompt(self, content, **kwargs):
+        time.sleep(0.05)  # long enough for a speculative completion to open its stream
+        return {"query_status": "BLOCK" if "block" in content else "PASS", "sanitized_content": content, "session_id": "s"}
+
+    def scan_response(self, prompt, content, session_id, **kwargs):
+        return {"query_status": "BLOCK" if "bad" in content else "PASS", "sanitized_content": content, "session_id": session_id}
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    opened = []
+
+    async def acompletion(**kwargs):
+        opened.append(_FakeStream(REPLY))
+        return opened[-1]
+
+    monkeypatch.setattr(app, "acompletion", acompletion)
+    monkeypatch.setattr(firewall_util, "_firewall_client", _FakeFirewall())
+    monkeypatch.setattr(firewall_util, "ENABLE_SCAN_CACHE", False)
+    return opened
+
+
+def _run(prompt):
+    messages = [{"role": "system", "content": "system"}, {"role": "user", "content": prompt}]
+
+    async def collect():
+        return [piece async for piece in app.secure_app(messages)]
+
+    return asyncio.run(collect()), messages
+
+
+def test_blocked_response_closes_the_stream(streams):
+    pieces, messages = _run("Summarize this GitHub user's activity.")
+    (stream,) = streams
+    assert stream.closed
+    assert stream.chunks_sent < len(REPLY) // 8
+    assert pieces[-1] == firewall_util.STATIC_RESPONSE
+    assert "bad" not in "".join(pieces)
+    assert messages[-1] == {"role": "assistant", "content": firewall_util.STATIC_RESPONSE}
+
+
+def test_blocked_prompt_closes_the_speculative_stream(streams, monkeypatch):
+    monkeypatch.setattr(app, "SPECULATIVE_COMPLETION", True)
+    monkeypatch.setattr(app, "STRICT_MODE", False)
+    pieces, messages = _run("Please block this prompt.")
+    (stream,) = streams
+    assert stream.closed
+    assert pieces == [firewall_util.STATIC_RESPONSE]
+    assert messages[-1]["content"] == firewall_util.STATIC_RESPONSE
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+
+import firewall_util
+
+
+class _FakeFirewall:
+    """Stands in for LLMDefenseClient; every scan passes and gets a fresh session id."""
+
+    user_info = "user@example.com"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def scan_prompt(self, content, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"query_status": "PASS", "sanitized_content": content, "session_id": f"session-{self.calls}"}
+
+    def scan_response(self, prompt, content, session_id, **kwargs):
+        self.calls += 1
+        return {"query_status": "PASS", "sanitized_content": content, "session_id": session_id}
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache(monkeypatch):
+    monkeypatch.setattr(firewall_util, "ENABLE_SCAN_CACHE", True)
+    monkeypatch.setattr(firewall_util, "_semantic_cache", None)
+    firewall_util._scan_cache.clear()
+    yield
+    firewall_util._scan_cache.clear()
+
+
+@pytest.fixture
+def firewall(monkeypatch):
+    fake = _FakeFirewall()
+    monkeypatch.setattr(firewall_util, "_firewall_client", fake)
+    return fake
+
+
+PROMPT = "List the public repositories of this GitHub user, please."
+
+
+def test_prompt_cache_hit_skips_the_scan(firewall):
+    first = firewall_util.get_sanitized_prompt(PROMPT)
+    second = firewall_util.get_sanitized_prompt(PROMPT)
+    assert firewall.calls == 1
+    assert second.sanitized_content == first.sanitized_content == PROMPT
+    assert not second.block
+
+
+def test_prompt_cache_entry_expires(firewall, monkeypatch):
+    firewall_util.get_sanitized_prompt(PROMPT)
+    later = time.time() + firewall_util.SCAN_CACHE_TTL + 1
+    monkeypatch.setattr(firewall_util.time, "time", lambda: later)
+    firewall_util.get_sanitized_prompt(PROMPT)
+    assert firewall.calls == 2
+
+
+def test_prompt_cache_hit_carries_no_session_id(firewall):
+    assert firewall_util.get_sanitized_prompt(PROMPT).session_id == "session-1"
+    assert firewall_util.get_sanitized_prompt(PROMPT).session_id is None
+
+
+def test_response_cache_hit_carries_the_callers_session_id(firewall):
+    firewall_util.get_sanitized_response(PROMPT, "Here they are.", session_id="mine")
+    result = firewall_util.get_sanitized_response(PROMPT, "Here they are.", session_id="yours")
+    assert firewall.calls == 1
+    assert result.session_id == "yours"
+
+
+def test_single_flight_followers_get_no_session_id(monkeypatch):
+    fake = _FakeFirewall(delay=0.05)
+    monkeypatch.setattr(firewall_util, "_firewall_client", fake)
+
+    async def scan_concurrently():
+        return await asyncio.gather(*(firewall_util.aget_sanitized_prompt(PROMPT) for _ in range(3)))
+
+    results = asyncio.run(scan_concurrently())
+    assert fake.calls == 1
+    assert [result.session_id for result in results] == ["session-1", None, None]
+    assert firewall_util._inflight_scans == {}
+
+
+def test_single_flight_survives_cancelling_the_first_caller(monkeypatch):
+    fake = _FakeFirewall(delay=0.05)
+    monkeypatch.setattr(firewall_util, "_firewall_client", fake)
+
+    async def cancel_first_caller():
+        first = asyncio.ensure_future(firewall_util.aget_sanitized_prompt(PROMPT))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(firewall_util.aget_sanitized_prompt(PROMPT))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await follower
+
+    assert asyncio.run(cancel_first_caller()).sanitized_content == PROMPT
+    assert fake.calls == 1
+
+
+def _pooled_client(monkeypatch, handler):
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request)
+
+    monkeypatch.setattr(firewall_util, "_http_client", httpx.Client(transport=httpx.MockTransport(record)))
+    token = jwt.encode({"iss": "https://app.example.com"}, "a-test-signing-key-of-32-bytes-!!")
+    client = firewall_util._PooledLLMDefenseClient(token, user_info="user@example.com", base_url="https://firewall.test")
+    monkeypatch.setattr(firewall_util, "_firewall_client", client)
+    return requests
+
+
+def test_scan_is_retried_on_5xx(monkeypatch):
+    def handler(request):
+        if len(requests) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"query_status": "PASS", "sanitized_content": PROMPT, "session_id": "s"})
+
+    requests = _pooled_client(monkeypatch, handler)
+    result = firewall_util.get_sanitized_prompt(PROMPT)
+    assert len(requests) == 2
+    assert result.session_id == "s"
+
+
+def test_scan_is_not_retried_on_read_timeout(monkeypatch):
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    requests = _pooled_client(monkeypatch, handler)
+    result = firewall_util.get_sanitized_prompt(PROMPT)
+    assert len(requests) == 1
+    assert result.session_id is None and not result.block
+
+
+def test_retries_follow_the_current_setting(monkeypatch):
+    requests = _pooled_client(monkeypatch, lambda request: httpx.Response(502))
+    monkeypatch.setattr(firewall_util, "SCAN_RETRIES", 0)
+    firewall_util.get_sanitized_prompt(PROMPT)
+    assert len(requests) == 1
@@ -0,0 +1,61 @@
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import firewall_util
+
+
+class _LetterCountModel:
+    """Embeds text by its letter counts, so prompts differing only in punctuation match."""
+
+    def __init__(self, model_name):
+        pass
+
+    def encode(self, text, normalize_embeddings=False):
+        vector = np.zeros(26, dtype=np.float32)
+        for char in text.lower():
+            if "a" <= char <= "z":
+                vector[ord(char) - ord("a")] += 1
+        return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(firewall_util.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=_LetterCountModel))
+    return firewall_util.SemanticCache("stub", threshold=0.97, maxsize=4, ttl=60)
+
+
+def test_paraphrase_hits_while_fresh(cache, clock):
+    cache.add("u", cache.embed("What is the capital of France?"))
+    assert cache.lookup("u", cache.embed("what is the capital of france")) is not None
+    assert cache.lookup("other-user", cache.embed("what is the capital of france")) is None
+
+
+def test_readding_after_expiry_hits_again(cache, clock):
+    cache.add("u", cache.embed("What is the capital of France?"))
+    clock[0] += 61
+    assert cache.lookup("u", cache.embed("what is the capital of france")) is None
+
+    cache.add("u", cache.embed("What is the capital of France?"))
+    hit = cache.lookup("u", cache.embed("what is the capital of france"))
+    assert hit is not None and hit.expires_at == clock[0] + 60
+
+
+def test_expired_rows_are_dropped(cache, clock):
+    cache.add("u", cache.embed("first prompt"))
+    clock[0] += 30
+    cache.add("u", cache.embed("second prompt"))
+    clock[0] += 31
+    cache.add("u", cache.embed("third prompt"))
+    vectors, expiries = cache._partitions["u"]
+    assert len(vectors) == len(expiries) == 2